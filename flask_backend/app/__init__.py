@@ -1,19 +1,49 @@
+import click
 from flask import Flask
 from .config import Config
-from .models import db
+from .models import db, Event
+from . import sharding
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.config['SQLALCHEMY_BINDS'] = {
+        **app.config.get('SQLALCHEMY_BINDS', {}), **app.config['SHARDS']}
 
     db.init_app(app)
 
     with app.app_context():
-        db.create_all()
+        # Shard databases get their tables from create_shard_tables, not from
+        # the (empty) per-bind metadata Flask-SQLAlchemy keeps for them
+        db.create_all(bind_key=None)
+        sharding.create_shard_tables()
+        # create_all skips indexes added to tables that already exist
+        for engine in db.engines.values():
+            for index in Event.__table__.indexes:
+                index.create(engine, checkfirst=True)
 
     # register blueprints / routes
     from .routes import main_bp
     app.register_blueprint(main_bp)
+    app.before_request(sharding.route_request)
+
+    from .compression import compress_response
+    app.after_request(compress_response)
+
+    @app.cli.command('move-estate')
+    @click.argument('estate_id', type=int)
+    @click.argument('shard')
+    @click.option('--grace', type=int, default=None,
+                  help='Seconds to wait for in-flight writes (default SHARD_MOVE_GRACE).')
+    @click.option('--force', is_flag=True,
+                  help='Move even if rows reference other estates across shards.')
+    def move_estate_command(estate_id, shard, grace, force):
+        """Move an estate and all its rows to another shard."""
+        try:
+            moved = sharding.move_estate(estate_id, shard, grace=grace, force=force)
+        except (LookupError, ValueError, RuntimeError) as e:
+            raise click.ClickException(str(e))
+        click.echo(f'Moved estate {estate_id} to {shard} ({moved} rows)')
 
     return app
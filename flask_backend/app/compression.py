@@ -0,0 +1,108 @@
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+def _accepted_encodings():
+    """Parse Accept-Encoding into {coding: q}."""
+    accepted = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(config):
+    """The supported coding with the highest q, preferring br on ties."""
+    accepted = _accepted_encodings()
+    wildcard = accepted.get('*', 0.0)
+    available = ['gzip']
+    if brotli is not None and config['COMPRESS_BROTLI']:
+        available.insert(0, 'br')
+
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    # An explicitly preferred identity wins over compression
+    if best is not None and accepted.get('identity', 0.0) > best_q:
+        return None
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding, level):
+        if encoding == 'br':
+            obj = brotli.Compressor(quality=min(level, 11))
+            self.compress = obj.process
+            self.sync = obj.flush
+            self.flush = obj.finish
+        else:
+            # wbits 16 + MAX_WBITS produces a gzip container instead of raw zlib
+            obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.compress = obj.compress
+            self.sync = lambda: obj.flush(zlib.Z_SYNC_FLUSH)
+            self.flush = obj.flush
+
+
+def _stream(chunks, compressor):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        # Sync-flush every chunk so slow streams reach the client as they are
+        # produced instead of waiting for the compressor's buffer to fill
+        data = compressor.compress(chunk) + compressor.sync()
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli-encode eligible responses."""
+    config = current_app.config
+
+    if not config['COMPRESS_ENABLED']:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code < 200 or response.status_code >= 300
+            or response.status_code == 204
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']
+            or request.method == 'HEAD'):
+        return response
+
+    encoding = choose_encoding(config)
+    if encoding is None:
+        return response
+
+    compressor = _Compressor(encoding, config['COMPRESS_LEVEL'])
+    if response.is_streamed:
+        # Compress chunk by chunk so streamed bodies are never buffered whole
+        response.response = _stream(response.response, compressor)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compressor.compress(body) + compressor.flush())
+
+    response.headers['Content-Encoding'] = encoding
+    return response
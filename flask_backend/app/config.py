@@ -8,3 +8,32 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, '..', 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Estate shards (see app/sharding.py), e.g.
+    # SHARD_DATABASE_URLS="east=sqlite:////data/east.db,west=postgresql://db/app?options=-csearch_path%3Dwest"
+    SHARDS = dict(
+        item.split('=', 1) for item in
+        os.environ.get('SHARD_DATABASE_URLS', '').split(',') if item
+    )
+    DEFAULT_SHARD = os.environ.get('DEFAULT_SHARD') or 'default'
+    # Seconds move-estate waits for in-flight writes after blocking the estate
+    SHARD_MOVE_GRACE = int(os.environ.get('SHARD_MOVE_GRACE', 30))
+
+    # Widest window /api/estate/<id>/events will expand recurring events over
+    CALENDAR_MAX_DAYS = int(os.environ.get('CALENDAR_MAX_DAYS', 366))
+
+    # Per-user timelines (see app/timeline.py)
+    TIMELINE_MAX_USERS = int(os.environ.get('TIMELINE_MAX_USERS', 10000))
+    TIMELINE_MAX_ITEMS = int(os.environ.get('TIMELINE_MAX_ITEMS', 200))
+    TIMELINE_FANOUT_LIMIT = int(os.environ.get('TIMELINE_FANOUT_LIMIT', 1000))  # residents
+    TIMELINE_TTL = int(os.environ.get('TIMELINE_TTL', 60))  # seconds
+
+    # Connections each worker opens per engine during warm-up (see app/warmup.py)
+    WARMUP_CONNECTIONS = int(os.environ.get('WARMUP_CONNECTIONS', 5))
+
+    # Response compression (see app/compression.py)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') != '0'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))  # bytes
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI = True  # used only when the brotli package is installed
+    COMPRESS_MIMETYPES = ['application/json', 'text/plain', 'text/html']
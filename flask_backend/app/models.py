@@ -1,6 +1,14 @@
+from datetime import datetime, timezone
+
 from flask_sqlalchemy import SQLAlchemy
+from .sharding import ShardSession
+
+db = SQLAlchemy(session_options={'class_': ShardSession})
 
-db = SQLAlchemy()
+
+def utcnow():
+    """Naive UTC now with microseconds; CURRENT_TIMESTAMP has whole seconds."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 # Association table for Event attendees (many-to-many)
 event_attendees = db.Table('event_attendees',
@@ -14,6 +22,26 @@ project_contributors = db.Table('project_contributors',
     db.Column('project_id', db.Integer, db.ForeignKey('project.id'), primary_key=True)
 )
 
+# Shard map: which shard holds each estate's rows (default database only)
+class EstateShard(db.Model):
+    __tablename__ = 'estate_shard'
+    estate_id = db.Column(db.Integer, primary_key=True)
+    shard = db.Column(db.String(64), nullable=False)
+    moving = db.Column(db.Boolean, default=False, nullable=False)  # writes rejected while True
+    version = db.Column(db.Integer, default=0, nullable=False, index=True)  # map version of last change
+
+    def __repr__(self):
+        return f"<EstateShard {self.estate_id} -> {self.shard}>"
+
+# Next free primary key per table, shared by all shards (default database only)
+class IdSequence(db.Model):
+    __tablename__ = 'id_sequence'
+    name = db.Column(db.String(64), primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<IdSequence {self.name} {self.next_id}>"
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
@@ -46,26 +74,39 @@ class Estate(db.Model):
         return f"<Estate {self.name}>"
 
 class Event(db.Model):
+    __table_args__ = (db.Index('ix_event_estate_id_date', 'estate_id', 'date'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     description = db.Column(db.Text)
-    date = db.Column(db.DateTime, nullable=False)
+    date = db.Column(db.DateTime, nullable=False, index=True)  # naive UTC; first occurrence if recurring
     location = db.Column(db.String(200))
     estate_id = db.Column(db.Integer, db.ForeignKey('estate.id'), nullable=True)
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(db.DateTime, default=utcnow)
     attendees = db.relationship('User', secondary='event_attendees', backref='attending_events', lazy='dynamic')
+    recurrence = db.relationship('EventRecurrence', backref='event', uselist=False,
+                                 lazy='joined', cascade='all, delete-orphan')
 
     def __repr__(self):
         return f"<Event {self.name}>"
 
+# Recurrence rule for repeating events, expanded lazily by app/recurrence.py
+class EventRecurrence(db.Model):
+    __tablename__ = 'event_recurrence'
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
+    rule = db.Column(db.String(200), nullable=False)  # e.g. FREQ=WEEKLY;INTERVAL=1;COUNT=10
+    until = db.Column(db.DateTime, nullable=True, index=True)  # last occurrence, NULL if endless
+
+    def __repr__(self):
+        return f"<EventRecurrence {self.event_id} {self.rule}>"
+
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
     content = db.Column(db.Text, nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     estate_id = db.Column(db.Integer, db.ForeignKey('estate.id'), nullable=True)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(db.DateTime, default=utcnow)
     comments = db.relationship('Comment', backref='post', lazy=True)
 
     def __repr__(self):
@@ -76,7 +117,7 @@ class Comment(db.Model):
     content = db.Column(db.Text, nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(db.DateTime, default=utcnow)
 
     def __repr__(self):
         return f"<Comment by User {self.author_id} on Post {self.post_id}>"
@@ -89,9 +130,7 @@ class Project(db.Model):
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     state = db.Column(db.Boolean, default=True, nullable=False)  # True=active/ongoing, False=inactive/completed
     cost_estimates = db.Column(db.Float, nullable=True)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    estate = db.relationship('Estate', backref='projects', lazy=True)
-    creator = db.relationship('User', backref='created_projects', lazy=True)  # Renamed to avoid conflict
+    created_at = db.Column(db.DateTime, default=utcnow)
 
     def __repr__(self):
         return f"<Project {self.project_name}>"
@@ -0,0 +1,174 @@
+"""Date parsing and recurrence-rule expansion for the event calendar.
+
+Recurring events are stored once, with an RFC 5545 style rule such as
+"FREQ=WEEKLY;INTERVAL=2;COUNT=10" or "FREQ=MONTHLY;UNTIL=20251231". The
+rule is only expanded inside a requested window, so an open-ended weekly
+meeting costs one row however far the calendar is browsed.
+"""
+import calendar
+from datetime import date, datetime, timedelta, timezone
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+# Upper bound of one period in days, for the span check in parse()
+PERIOD_DAYS = {'DAILY': 1, 'WEEKLY': 7, 'MONTHLY': 31, 'YEARLY': 366}
+MAX_SPAN_YEARS = 1000
+
+
+def parse_datetime(value):
+    """Parse an ISO 8601 date or datetime into a naive UTC datetime.
+
+    Raises ValueError for anything that is not a valid ISO string.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    elif isinstance(value, str):
+        text = value.strip()
+        if text.endswith(('Z', 'z')):
+            text = text[:-1] + '+00:00'
+        parsed = datetime.fromisoformat(text)
+    else:
+        raise ValueError(f'Expected an ISO 8601 date string, got {value!r}')
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _add_months(start, months):
+    """Return start shifted by months, or None if that day does not exist."""
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    if start.day > calendar.monthrange(year, month)[1]:
+        return None
+    return start.replace(year=year, month=month)
+
+
+class RecurrenceRule:
+    """A parsed FREQ/INTERVAL/COUNT/UNTIL recurrence rule."""
+
+    def __init__(self, freq, interval=1, count=None, until=None):
+        self.freq = freq
+        self.interval = interval
+        self.count = count
+        self.until = until
+
+    @classmethod
+    def parse(cls, text):
+        """Parse a rule string; raises ValueError for anything invalid."""
+        if not isinstance(text, str):
+            raise ValueError(f'Recurrence must be a string, got {type(text).__name__}')
+        parts = {}
+        for item in text.strip().upper().split(';'):
+            if not item:
+                continue
+            key, sep, val = item.partition('=')
+            if not sep or not val:
+                raise ValueError(f'Malformed recurrence part {item!r}')
+            parts[key] = val
+
+        freq = parts.pop('FREQ', None)
+        if freq not in FREQUENCIES:
+            raise ValueError(f'FREQ must be one of {", ".join(FREQUENCIES)}')
+        try:
+            interval = int(parts.pop('INTERVAL', 1))
+            count = int(parts.pop('COUNT')) if 'COUNT' in parts else None
+        except ValueError:
+            raise ValueError('INTERVAL and COUNT must be integers')
+        until = parts.pop('UNTIL', None)
+        if parts:
+            raise ValueError(f'Unsupported recurrence parts: {", ".join(sorted(parts))}')
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError('INTERVAL and COUNT must be positive')
+        if count is not None and until is not None:
+            raise ValueError('COUNT and UNTIL cannot both be set')
+        periods = count - 1 if count is not None else 1
+        if interval * periods * PERIOD_DAYS[freq] > MAX_SPAN_YEARS * 366:
+            raise ValueError(f'INTERVAL and COUNT may span at most {MAX_SPAN_YEARS} years')
+        if until is not None:
+            until = until.rstrip('Z')
+            fmt = '%Y%m%dT%H%M%S' if 'T' in until else '%Y%m%d'
+            until = datetime.strptime(until, fmt)
+            if fmt == '%Y%m%d':
+                # A date-only UNTIL includes the whole day
+                until += timedelta(days=1) - timedelta(microseconds=1)
+        return cls(freq, interval, count, until)
+
+    def __str__(self):
+        text = f'FREQ={self.freq}'
+        if self.interval != 1:
+            text += f';INTERVAL={self.interval}'
+        if self.count is not None:
+            text += f';COUNT={self.count}'
+        if self.until is not None:
+            text += f';UNTIL={self.until:%Y%m%dT%H%M%S}'
+        return text
+
+    def _nth(self, start, n):
+        """The n-th period of the series (None for a skipped month day).
+
+        Periods past the last representable date come back as datetime.max,
+        which ends the series.
+        """
+        step = n * self.interval
+        try:
+            if self.freq == 'DAILY':
+                return start + timedelta(days=step)
+            if self.freq == 'WEEKLY':
+                return start + timedelta(weeks=step)
+            return _add_months(start, step * (12 if self.freq == 'YEARLY' else 1))
+        except (OverflowError, ValueError):
+            return datetime.max
+
+    def _walks(self, start):
+        # Month days past the 28th can be skipped, which shifts COUNT, so
+        # those series are walked from the start; all others jump ahead.
+        return self.count is not None and self.freq in ('MONTHLY', 'YEARLY') and start.day > 28
+
+    def _first_period(self, start, window_start):
+        """Index of the first period that can fall on or after window_start."""
+        if window_start <= start:
+            return 0
+        if self.freq in ('DAILY', 'WEEKLY'):
+            unit = timedelta(days=self.interval * (1 if self.freq == 'DAILY' else 7))
+            return (window_start - start) // unit
+        months = (window_start.year - start.year) * 12 + window_start.month - start.month
+        unit = self.interval * (12 if self.freq == 'YEARLY' else 1)
+        return max(months // unit - 1, 0)
+
+    def occurrences(self, start, window_start, window_end):
+        """Yield occurrences of a series beginning at start that fall in
+        [window_start, window_end), in order.
+        """
+        n = 0 if self._walks(start) else self._first_period(start, window_start)
+        seen = n
+        while True:
+            if self.count is not None and seen >= self.count:
+                return
+            occurrence = self._nth(start, n)
+            n += 1
+            if occurrence is None:
+                continue
+            seen += 1
+            if (occurrence == datetime.max or occurrence >= window_end
+                    or (self.until and occurrence > self.until)):
+                return
+            if occurrence >= window_start:
+                yield occurrence
+
+    def last_occurrence(self, start):
+        """The final occurrence of the series, or None if it never ends.
+
+        datetime.max stands in for a series that outruns the calendar.
+        """
+        if self.until is not None:
+            return self.until
+        if self.count is None:
+            return None
+        if not self._walks(start):
+            return self._nth(start, self.count - 1)
+        last = start
+        for last in self.occurrences(start, start, datetime.max):
+            pass
+        return last
@@ -1,18 +1,61 @@
-from flask import Blueprint, jsonify, request
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, current_app, jsonify, request
 from werkzeug.security import generate_password_hash
-from .models import db, User, Estate, Event, Post, Comment, Project
+from .models import (db, User, Estate, Event, EventRecurrence, Post, Comment, Project,
+                     event_attendees)
+from .recurrence import RecurrenceRule, parse_datetime
+from .sharding import fan_out
+from . import timeline, warmup
 
 main_bp = Blueprint('main', __name__)
 
+def list_response(rows):
+    """Serialize a list of dicts, as columns when ?format=columnar is given.
+
+    Columnar output sends each column name once with an array of its values,
+    e.g. {"columns": ["id", "name"], "values": [[1, 2], ["a", "b"]], "count": 2}.
+    """
+    if request.args.get('format') == 'columnar':
+        columns = list(rows[0].keys()) if rows else []
+        return jsonify({
+            'columns': columns,
+            'values': [[row[column] for row in rows] for column in columns],
+            'count': len(rows)
+        })
+    return jsonify(rows)
+
+def set_recurrence(event, rule):
+    """Attach, update or (rule=None) remove an event's recurrence rule."""
+    if rule is None:
+        event.recurrence = None
+        return
+    if event.recurrence is None:
+        event.recurrence = EventRecurrence()
+    event.recurrence.rule = str(rule)
+    event.recurrence.until = rule.last_occurrence(event.date)
+
 @main_bp.route('/')
 def index():
     return jsonify({'status': 'ok', 'message': 'Flask app is running'})
 
+# HEALTH ROUTES
+@main_bp.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the worker process is up and serving requests."""
+    return jsonify({'status': 'ok'})
+
+@main_bp.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: every database answers."""
+    databases = warmup.check_databases()
+    if any(databases.values()):
+        return jsonify({'status': 'unavailable', 'databases': databases}), 503
+    return jsonify({'status': 'ready', 'databases': list(databases)})
+
 # USER ROUTES
 @main_bp.route('/api/user', methods=['GET'])
 def api_get_users():
-    users = User.query.all()
-    return jsonify([{
+    return list_response(fan_out(lambda: [{
         'id': user.id,
         'username': user.username,
         'email': user.email,
@@ -20,7 +63,7 @@ def api_get_users():
         'phone': user.phone,
         'estate_id': user.estate_id,
         'created_at': user.created_at.isoformat()
-    } for user in users])
+    } for user in User.query.all()]))
 
 @main_bp.route('/api/user/<int:user_id>', methods=['GET'])
 def api_get_user_by_id(user_id):
@@ -89,18 +132,20 @@ def api_update_user(user_id):
 
     try:
         db.session.commit()
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'full_name': user.full_name,
-            'phone': user.phone,
-            'estate_id': user.estate_id,
-            'created_at': user.created_at.isoformat()
-        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update user', 'message': str(e)}), 500
+    if 'estate_id' in data:
+        timeline.forget_user(user.id)
+    return jsonify({
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'full_name': user.full_name,
+        'phone': user.phone,
+        'estate_id': user.estate_id,
+        'created_at': user.created_at.isoformat()
+    })
 
 @main_bp.route('/api/user/<int:user_id>', methods=['DELETE'])
 def api_delete_user(user_id):
@@ -108,22 +153,40 @@ def api_delete_user(user_id):
     try:
         db.session.delete(user)
         db.session.commit()
-        return jsonify({'message': f'User {user_id} deleted successfully'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to delete user', 'message': str(e)}), 500
+    timeline.forget_user(user_id)
+    return jsonify({'message': f'User {user_id} deleted successfully'})
+
+@main_bp.route('/api/user/<int:user_id>/timeline', methods=['GET'])
+def api_get_user_timeline(user_id):
+    """Estate posts and comments, attended events and contributed projects, newest first."""
+    user = User.query.get_or_404(user_id)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    before = request.args.get('before')
+    try:
+        before = timeline.decode_cursor(before) if before else None
+    except ValueError:
+        return jsonify({'error': 'Invalid before cursor'}), 400
+
+    entries = timeline.get_page(user, before, limit)
+    return jsonify({
+        'items': [dict(entry, created_at=entry['created_at'].isoformat()) for entry in entries],
+        'next_before': timeline.encode_cursor(timeline.entry_key(entries[-1]))
+                       if len(entries) == limit else None
+    })
 
 # ESTATE ROUTES
 @main_bp.route('/api/estate', methods=['GET'])
 def api_get_estates():
-    estates = Estate.query.all()
-    return jsonify([{
+    return list_response(fan_out(lambda: [{
         'id': estate.id,
         'name': estate.name,
         'address': estate.address,
         'description': estate.description,
         'created_at': estate.created_at.isoformat()
-    } for estate in estates])
+    } for estate in Estate.query.all()]))
 
 @main_bp.route('/api/estate/<int:estate_id>', methods=['GET'])
 def api_get_estate_by_id(estate_id):
@@ -203,18 +266,18 @@ def api_delete_estate(estate_id):
 # EVENT ROUTES
 @main_bp.route('/api/event', methods=['GET'])
 def api_get_events():
-    events = Event.query.all()
-    return jsonify([{
+    return list_response(fan_out(lambda: [{
         'id': event.id,
         'name': event.name,
         'description': event.description,
         'date': event.date.isoformat(),
+        'recurrence': event.recurrence.rule if event.recurrence else None,
         'location': event.location,
         'estate_id': event.estate_id,
         'creator_id': event.creator_id,
         'created_at': event.created_at.isoformat(),
         'attendees': [user.id for user in event.attendees]
-    } for event in events])
+    } for event in Event.query.all()]))
 
 @main_bp.route('/api/event/<int:event_id>', methods=['GET'])
 def api_get_event_by_id(event_id):
@@ -224,6 +287,7 @@ def api_get_event_by_id(event_id):
         'name': event.name,
         'description': event.description,
         'date': event.date.isoformat(),
+        'recurrence': event.recurrence.rule if event.recurrence else None,
         'location': event.location,
         'estate_id': event.estate_id,
         'creator_id': event.creator_id,
@@ -237,10 +301,16 @@ def api_create_event():
     if not data or not all(field in data for field in ['name', 'date', 'creator_id']):
         return jsonify({'error': 'Missing required fields'}), 400
 
+    try:
+        date = parse_datetime(data['date'])
+        rule = RecurrenceRule.parse(data['recurrence']) if data.get('recurrence') else None
+    except ValueError as e:
+        return jsonify({'error': 'Invalid date or recurrence', 'message': str(e)}), 400
+
     event = Event(
         name=data['name'],
         description=data.get('description'),
-        date=data['date'],
+        date=date,
         location=data.get('location'),
         estate_id=data.get('estate_id'),
         creator_id=data['creator_id']
@@ -248,26 +318,29 @@ def api_create_event():
     
     try:
         db.session.add(event)
+        set_recurrence(event, rule)
         if 'attendees' in data and isinstance(data['attendees'], list):
             for user_id in data['attendees']:
                 user = User.query.get(user_id)
                 if user:
                     event.attendees.append(user)
         db.session.commit()
-        return jsonify({
-            'id': event.id,
-            'name': event.name,
-            'description': event.description,
-            'date': event.date.isoformat(),
-            'location': event.location,
-            'estate_id': event.estate_id,
-            'creator_id': event.creator_id,
-            'created_at': event.created_at.isoformat(),
-            'attendees': [user.id for user in event.attendees]
-        }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to create event', 'message': str(e)}), 500
+    timeline.publish_event(event)
+    return jsonify({
+        'id': event.id,
+        'name': event.name,
+        'description': event.description,
+        'date': event.date.isoformat(),
+        'recurrence': event.recurrence.rule if event.recurrence else None,
+        'location': event.location,
+        'estate_id': event.estate_id,
+        'creator_id': event.creator_id,
+        'created_at': event.created_at.isoformat(),
+        'attendees': [user.id for user in event.attendees]
+    }), 201
 
 @main_bp.route('/api/event/<int:event_id>', methods=['PATCH'])
 def api_update_event(event_id):
@@ -276,12 +349,21 @@ def api_update_event(event_id):
     if not data:
         return jsonify({'error': 'No data provided'}), 400
 
+    try:
+        date = parse_datetime(data['date']) if 'date' in data else event.date
+        if 'recurrence' in data:
+            rule = RecurrenceRule.parse(data['recurrence']) if data['recurrence'] else None
+        else:
+            rule = RecurrenceRule.parse(event.recurrence.rule) if event.recurrence else None
+    except ValueError as e:
+        return jsonify({'error': 'Invalid date or recurrence', 'message': str(e)}), 400
+
     if 'name' in data:
         event.name = data['name']
     if 'description' in data:
         event.description = data['description']
-    if 'date' in data:
-        event.date = data['date']
+    event.date = date
+    set_recurrence(event, rule)
     if 'location' in data:
         event.location = data['location']
     if 'estate_id' in data:
@@ -295,20 +377,22 @@ def api_update_event(event_id):
 
     try:
         db.session.commit()
-        return jsonify({
-            'id': event.id,
-            'name': event.name,
-            'description': event.description,
-            'date': event.date.isoformat(),
-            'location': event.location,
-            'estate_id': event.estate_id,
-            'creator_id': event.creator_id,
-            'created_at': event.created_at.isoformat(),
-            'attendees': [user.id for user in event.attendees]
-        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update event', 'message': str(e)}), 500
+    timeline.publish_event(event)
+    return jsonify({
+        'id': event.id,
+        'name': event.name,
+        'description': event.description,
+        'date': event.date.isoformat(),
+        'recurrence': event.recurrence.rule if event.recurrence else None,
+        'location': event.location,
+        'estate_id': event.estate_id,
+        'creator_id': event.creator_id,
+        'created_at': event.created_at.isoformat(),
+        'attendees': [user.id for user in event.attendees]
+    })
 
 @main_bp.route('/api/event/<int:event_id>', methods=['DELETE'])
 def api_delete_event(event_id):
@@ -316,16 +400,70 @@ def api_delete_event(event_id):
     try:
         db.session.delete(event)
         db.session.commit()
-        return jsonify({'message': f'Event {event_id} deleted successfully'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to delete event', 'message': str(e)}), 500
+    timeline.retract('event', event_id)
+    return jsonify({'message': f'Event {event_id} deleted successfully'})
+
+@main_bp.route('/api/estate/<int:estate_id>/events', methods=['GET'])
+def api_get_estate_calendar(estate_id):
+    """Event occurrences in [from, to) for one estate, recurring events expanded."""
+    Estate.query.get_or_404(estate_id)
+    try:
+        start = parse_datetime(request.args['from']) if 'from' in request.args \
+            else parse_datetime(datetime.now(timezone.utc))
+        end = parse_datetime(request.args['to']) if 'to' in request.args \
+            else start + timedelta(days=31)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid date range', 'message': str(e)}), 400
+    if end <= start:
+        return jsonify({'error': 'Invalid date range', 'message': "'to' must be after 'from'"}), 400
+    if end - start > timedelta(days=current_app.config['CALENDAR_MAX_DAYS']):
+        return jsonify({'error': 'Invalid date range',
+                        'message': f"Range exceeds {current_app.config['CALENDAR_MAX_DAYS']} days"}), 400
+
+    single = Event.query.outerjoin(EventRecurrence).filter(
+        Event.estate_id == estate_id,
+        EventRecurrence.event_id.is_(None),
+        Event.date >= start,
+        Event.date < end
+    ).all()
+    recurring = Event.query.join(EventRecurrence).filter(
+        Event.estate_id == estate_id,
+        Event.date < end,
+        db.or_(EventRecurrence.until.is_(None), EventRecurrence.until >= start)
+    ).all()
+
+    occurrences = [(event.date, event) for event in single]
+    for event in recurring:
+        rule = RecurrenceRule.parse(event.recurrence.rule)
+        occurrences.extend((when, event) for when in rule.occurrences(event.date, start, end))
+    occurrences.sort(key=lambda occurrence: (occurrence[0], occurrence[1].id))
+
+    attendees = {event.id: [] for event in single + recurring}
+    rows = db.session.query(event_attendees.c.event_id, event_attendees.c.user_id).filter(
+        event_attendees.c.event_id.in_(attendees)
+    ).order_by(event_attendees.c.event_id, event_attendees.c.user_id)
+    for event_id, user_id in rows:
+        attendees[event_id].append(user_id)
+    return list_response([{
+        'id': event.id,
+        'name': event.name,
+        'description': event.description,
+        'date': when.isoformat(),
+        'recurrence': event.recurrence.rule if event.recurrence else None,
+        'location': event.location,
+        'estate_id': event.estate_id,
+        'creator_id': event.creator_id,
+        'created_at': event.created_at.isoformat(),
+        'attendees': attendees[event.id]
+    } for when, event in occurrences])
 
 # PROJECT ROUTES
 @main_bp.route('/api/project', methods=['GET'])
 def api_get_projects():
-    projects = Project.query.all()
-    return jsonify([{
+    return list_response(fan_out(lambda: [{
         'id': project.id,
         'project_name': project.project_name,
         'description': project.description,
@@ -335,7 +473,7 @@ def api_get_projects():
         'cost_estimates': project.cost_estimates,
         'created_at': project.created_at.isoformat(),
         'contributors': [user.id for user in project.contributors]
-    } for project in projects])
+    } for project in Project.query.all()]))
 
 @main_bp.route('/api/project/<int:project_id>', methods=['GET'])
 def api_get_project_by_id(project_id):
@@ -375,20 +513,21 @@ def api_create_project():
                 if user:
                     project.contributors.append(user)
         db.session.commit()
-        return jsonify({
-            'id': project.id,
-            'project_name': project.project_name,
-            'description': project.description,
-            'estate_id': project.estate_id,
-            'creator_id': project.creator_id,
-            'state': project.state,
-            'cost_estimates': project.cost_estimates,
-            'created_at': project.created_at.isoformat(),
-            'contributors': [user.id for user in project.contributors]
-        }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to create project', 'message': str(e)}), 500
+    timeline.publish_project(project)
+    return jsonify({
+        'id': project.id,
+        'project_name': project.project_name,
+        'description': project.description,
+        'estate_id': project.estate_id,
+        'creator_id': project.creator_id,
+        'state': project.state,
+        'cost_estimates': project.cost_estimates,
+        'created_at': project.created_at.isoformat(),
+        'contributors': [user.id for user in project.contributors]
+    }), 201
 
 @main_bp.route('/api/project/<int:project_id>', methods=['PATCH'])
 def api_update_project(project_id):
@@ -416,20 +555,21 @@ def api_update_project(project_id):
 
     try:
         db.session.commit()
-        return jsonify({
-            'id': project.id,
-            'project_name': project.project_name,
-            'description': project.description,
-            'estate_id': project.estate_id,
-            'creator_id': project.creator_id,
-            'state': project.state,
-            'cost_estimates': project.cost_estimates,
-            'created_at': project.created_at.isoformat(),
-            'contributors': [user.id for user in project.contributors]
-        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update project', 'message': str(e)}), 500
+    timeline.publish_project(project)
+    return jsonify({
+        'id': project.id,
+        'project_name': project.project_name,
+        'description': project.description,
+        'estate_id': project.estate_id,
+        'creator_id': project.creator_id,
+        'state': project.state,
+        'cost_estimates': project.cost_estimates,
+        'created_at': project.created_at.isoformat(),
+        'contributors': [user.id for user in project.contributors]
+    })
 
 @main_bp.route('/api/project/<int:project_id>', methods=['DELETE'])
 def api_delete_project(project_id):
@@ -437,23 +577,23 @@ def api_delete_project(project_id):
     try:
         db.session.delete(project)
         db.session.commit()
-        return jsonify({'message': f'Project {project_id} deleted successfully'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to delete project', 'message': str(e)}), 500
+    timeline.retract('project', project_id)
+    return jsonify({'message': f'Project {project_id} deleted successfully'})
 
 # POST ROUTES
 @main_bp.route('/api/post', methods=['GET'])
 def api_get_posts():
-    posts = Post.query.all()
-    return jsonify([{
+    return list_response(fan_out(lambda: [{
         'id': post.id,
         'title': post.title,
         'content': post.content,
         'author_id': post.author_id,
         'estate_id': post.estate_id,
         'created_at': post.created_at.isoformat()
-    } for post in posts])
+    } for post in Post.query.all()]))
 
 @main_bp.route('/api/post/<int:post_id>', methods=['GET'])
 def api_get_post_by_id(post_id):
@@ -483,17 +623,18 @@ def api_create_post():
     try:
         db.session.add(post)
         db.session.commit()
-        return jsonify({
-            'id': post.id,
-            'title': post.title,
-            'content': post.content,
-            'author_id': post.author_id,
-            'estate_id': post.estate_id,
-            'created_at': post.created_at.isoformat()
-        }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to create post', 'message': str(e)}), 500
+    timeline.publish_post(post)
+    return jsonify({
+        'id': post.id,
+        'title': post.title,
+        'content': post.content,
+        'author_id': post.author_id,
+        'estate_id': post.estate_id,
+        'created_at': post.created_at.isoformat()
+    }), 201
 
 @main_bp.route('/api/post/<int:post_id>', methods=['PATCH'])
 def api_update_post(post_id):
@@ -511,17 +652,18 @@ def api_update_post(post_id):
 
     try:
         db.session.commit()
-        return jsonify({
-            'id': post.id,
-            'title': post.title,
-            'content': post.content,
-            'author_id': post.author_id,
-            'estate_id': post.estate_id,
-            'created_at': post.created_at.isoformat()
-        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update post', 'message': str(e)}), 500
+    timeline.publish_post(post)
+    return jsonify({
+        'id': post.id,
+        'title': post.title,
+        'content': post.content,
+        'author_id': post.author_id,
+        'estate_id': post.estate_id,
+        'created_at': post.created_at.isoformat()
+    })
 
 @main_bp.route('/api/post/<int:post_id>', methods=['DELETE'])
 def api_delete_post(post_id):
@@ -529,22 +671,22 @@ def api_delete_post(post_id):
     try:
         db.session.delete(post)
         db.session.commit()
-        return jsonify({'message': f'Post {post_id} deleted successfully'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to delete post', 'message': str(e)}), 500
+    timeline.retract('post', post_id)
+    return jsonify({'message': f'Post {post_id} deleted successfully'})
 
 # COMMENT ROUTES
 @main_bp.route('/api/comment', methods=['GET'])
 def api_get_comments():
-    comments = Comment.query.all()
-    return jsonify([{
+    return list_response(fan_out(lambda: [{
         'id': comment.id,
         'content': comment.content,
         'author_id': comment.author_id,
         'post_id': comment.post_id,
         'created_at': comment.created_at.isoformat()
-    } for comment in comments])
+    } for comment in Comment.query.all()]))
 
 @main_bp.route('/api/comment/<int:comment_id>', methods=['GET'])
 def api_get_comment_by_id(comment_id):
@@ -572,16 +714,17 @@ def api_create_comment():
     try:
         db.session.add(comment)
         db.session.commit()
-        return jsonify({
-            'id': comment.id,
-            'content': comment.content,
-            'author_id': comment.author_id,
-            'post_id': comment.post_id,
-            'created_at': comment.created_at.isoformat()
-        }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to create comment', 'message': str(e)}), 500
+    timeline.publish_comment(comment)
+    return jsonify({
+        'id': comment.id,
+        'content': comment.content,
+        'author_id': comment.author_id,
+        'post_id': comment.post_id,
+        'created_at': comment.created_at.isoformat()
+    }), 201
 
 @main_bp.route('/api/comment/<int:comment_id>', methods=['PATCH'])
 def api_update_comment(comment_id):
@@ -595,16 +738,17 @@ def api_update_comment(comment_id):
 
     try:
         db.session.commit()
-        return jsonify({
-            'id': comment.id,
-            'content': comment.content,
-            'author_id': comment.author_id,
-            'post_id': comment.post_id,
-            'created_at': comment.created_at.isoformat()
-        })
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update comment', 'message': str(e)}), 500
+    timeline.publish_comment(comment)
+    return jsonify({
+        'id': comment.id,
+        'content': comment.content,
+        'author_id': comment.author_id,
+        'post_id': comment.post_id,
+        'created_at': comment.created_at.isoformat()
+    })
 
 @main_bp.route('/api/comment/<int:comment_id>', methods=['DELETE'])
 def api_delete_comment(comment_id):
@@ -612,7 +756,8 @@ def api_delete_comment(comment_id):
     try:
         db.session.delete(comment)
         db.session.commit()
-        return jsonify({'message': f'Comment {comment_id} deleted successfully'})
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': 'Failed to delete comment', 'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to delete comment', 'message': str(e)}), 500
+    timeline.retract('comment', comment_id)
+    return jsonify({'message': f'Comment {comment_id} deleted successfully'})
\ No newline at end of file
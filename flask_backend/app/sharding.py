@@ -0,0 +1,430 @@
+"""Estate-scoped routing of database traffic to shards.
+
+Every estate lives on exactly one shard: the default database
+(SQLALCHEMY_DATABASE_URI, shard name 'default') or one of the databases
+listed in the SHARDS config (name -> URI; a per-estate-group SQLite file or a
+Postgres URI whose search_path selects a schema). The estate -> shard map is
+kept in the estate_shard table of the default database; estates missing from
+it live on DEFAULT_SHARD.
+
+Each request is pinned to one shard, resolved in this order:
+  1. an estate id in the URL (/api/estate/<estate_id>/...);
+  2. an entity id in the URL (/api/user/<user_id>, /api/post/<post_id>, ...),
+     located by probing every shard in parallel;
+  3. ?estate_id=, the X-Estate-Id header or estate_id in the JSON body;
+  4. for writes, a parent row named in the body (post_id of a comment).
+Writes that name no estate (such as creating one) go to DEFAULT_SHARD, where
+a new, unmapped estate is looked up afterwards. Unscoped list requests fan
+out to all shards in parallel via fan_out().
+
+Primary keys come from the id_sequence table in the default database, so
+ids are unique across shards and rows keep them when an estate is moved.
+Every change to the shard map bumps a version number that each request
+checks, so all workers drop their cached map as soon as it changes.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, jsonify, request
+from flask_sqlalchemy.session import Session
+
+DEFAULT = 'default'
+DIRECTORY_TABLES = {'estate_shard', 'id_sequence'}
+GLOBAL_ID_TABLES = {'estate', 'user', 'event', 'post', 'comment', 'project'}
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# URL arguments naming a row whose shard decides the request's shard
+ENTITY_ARGS = {'user_id': 'user', 'post_id': 'post', 'event_id': 'event',
+               'comment_id': 'comment', 'project_id': 'project'}
+# JSON body fields naming the parent row of a new row
+PARENT_FIELDS = {'post_id': 'post'}
+
+
+class ShardSession(Session):
+    """Session that sends queries to the shard of the current request."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shard = current_shard()
+            if shard not in (None, DEFAULT) and not _is_directory(mapper):
+                return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_directory(mapper):
+    return mapper is not None and sa.inspect(mapper).local_table.name in DIRECTORY_TABLES
+
+
+@sa.event.listens_for(ShardSession, 'before_flush')
+def _assign_global_ids(session, flush_context, instances):
+    """Give new rows ids from the shared sequence instead of the shard's own."""
+    if not has_app_context() or not current_app.config['SHARDS']:
+        return
+    pending = {}
+    for obj in session.new:
+        table = sa.inspect(obj).mapper.local_table.name
+        if table in GLOBAL_ID_TABLES and obj.id is None:
+            pending.setdefault(table, []).append(obj)
+    for table, objs in pending.items():
+        for obj, new_id in zip(objs, allocate_ids(table, len(objs))):
+            obj.id = new_id
+
+
+def _state():
+    return current_app.extensions.setdefault(
+        'sharding', {'cache': {}, 'version': None})
+
+
+def shard_names():
+    return [DEFAULT] + list(current_app.config['SHARDS'])
+
+
+def engine_for(shard):
+    from .models import db
+    return db.engines[None if shard == DEFAULT else shard]
+
+
+def current_shard():
+    return g.get('shard') if has_app_context() else None
+
+
+def allocate_ids(table, count):
+    """Reserve count consecutive ids for table from the id_sequence table."""
+    from .models import IdSequence
+    seq = IdSequence.__table__
+    engine = engine_for(DEFAULT)
+    for _ in range(3):
+        with engine.begin() as conn:
+            updated = conn.execute(seq.update().where(seq.c.name == table)
+                                   .values(next_id=seq.c.next_id + count)).rowcount
+            if updated:
+                next_id = conn.execute(sa.select(seq.c.next_id)
+                                       .where(seq.c.name == table)).scalar()
+                return range(next_id - count, next_id)
+        # First allocation: start above every id already on any shard
+        start = 1 + max(_max_id(shard, table) for shard in shard_names())
+        try:
+            with engine.begin() as conn:
+                conn.execute(seq.insert().values(name=table, next_id=start + count))
+            return range(start, start + count)
+        except sa.exc.IntegrityError:
+            continue  # another process seeded the sequence first; retry the update
+    raise RuntimeError(f'Could not allocate ids for {table}')
+
+
+def _max_id(shard, table):
+    from .models import db
+    t = db.metadata.tables[table]
+    with engine_for(shard).connect() as conn:
+        return conn.execute(sa.select(sa.func.max(t.c.id))).scalar() or 0
+
+
+def _sync_map_version():
+    """Drop the cached shard map if any worker changed it since last request."""
+    from .models import db, EstateShard
+    version = db.session.query(sa.func.max(EstateShard.version)).scalar() or 0
+    state = _state()
+    if state['version'] != version:
+        state['cache'].clear()
+        state['version'] = version
+
+
+def shard_entry(estate_id):
+    """(shard, moving) for an estate, through the cached shard map."""
+    from .models import db, EstateShard
+    cache = _state()['cache']
+    if estate_id not in cache:
+        entry = db.session.get(EstateShard, estate_id)
+        cache[estate_id] = ((entry.shard, entry.moving) if entry
+                            else (current_app.config['DEFAULT_SHARD'], False))
+    return cache[estate_id]
+
+
+def shard_for_estate(estate_id):
+    """Resolve an estate to its shard name through the shard map."""
+    return shard_entry(estate_id)[0]
+
+
+def _locate_query(table, item_id):
+    from .models import db
+    t = db.metadata.tables
+    if table == 'comment':
+        return (sa.select(t['post'].c.estate_id)
+                .select_from(t['comment'].join(t['post']))
+                .where(t['comment'].c.id == item_id))
+    return sa.select(t[table].c.estate_id).where(t[table].c.id == item_id)
+
+
+def locate(table, item_id):
+    """Find the shard holding a row; returns (shard, estate_id) or None.
+
+    While an estate is being moved its rows exist on two shards; the one
+    the shard map points at wins.
+    """
+    query = _locate_query(table, item_id)
+    engines = {shard: engine_for(shard) for shard in shard_names()}
+
+    def probe(shard):
+        with engines[shard].connect() as conn:
+            row = conn.execute(query).first()
+        return shard, row
+
+    with ThreadPoolExecutor(max_workers=len(engines)) as pool:
+        found = [(shard, row[0]) for shard, row in pool.map(probe, engines) if row is not None]
+    if not found:
+        return None
+    for shard, estate_id in found:
+        if estate_id is not None and shard_for_estate(estate_id) == shard:
+            return shard, estate_id
+    return found[0]
+
+
+def _int_or_none(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _json_body():
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            return data
+    return {}
+
+
+def _error(status, error, message):
+    return jsonify({'error': error, 'message': message}), status
+
+
+def route_request():
+    """before_request hook: pin the request to one shard (see module doc)."""
+    if not current_app.config['SHARDS']:
+        return
+    _sync_map_version()
+    view_args = request.view_args or {}
+    body = _json_body()
+    writing = request.method in WRITE_METHODS
+    shard = estate_id = None
+
+    if view_args.get('estate_id') is not None:
+        estate_id = view_args['estate_id']
+        shard = shard_for_estate(estate_id)
+    else:
+        arg = next((a for a in ENTITY_ARGS if a in view_args), None)
+        if arg is not None:
+            located = locate(ENTITY_ARGS[arg], view_args[arg])
+            if located is not None:
+                shard, estate_id = located
+                new_estate = _int_or_none(body.get('estate_id')) if writing else None
+                if new_estate is not None and shard_for_estate(new_estate) != shard:
+                    return _error(400, 'Cross-shard update',
+                                  f'Estate {new_estate} lives on another shard; use move-estate')
+        else:
+            estate_id = _int_or_none(request.args.get('estate_id')
+                                     or request.headers.get('X-Estate-Id')
+                                     or body.get('estate_id'))
+            if estate_id is not None:
+                shard = shard_for_estate(estate_id)
+            elif writing:
+                for field, table in PARENT_FIELDS.items():
+                    if field in body:
+                        located = locate(table, _int_or_none(body[field]))
+                        if located is None:
+                            return _error(400, 'Cannot resolve shard',
+                                          f'{table} {body[field]} not found')
+                        shard, estate_id = located
+                        break
+            if writing and shard is None:
+                shard = current_app.config['DEFAULT_SHARD']
+
+    if writing and estate_id is not None and shard_entry(estate_id)[1]:
+        response = _error(503, 'Estate is being moved', 'Retry shortly')
+        response[0].headers['Retry-After'] = '5'
+        return response
+    g.estate_id = estate_id
+    g.shard = shard
+
+
+def fan_out(query_fn):
+    """Run query_fn on every shard in parallel and merge the results.
+
+    query_fn must return a list of plain dicts (serialize inside it: ORM
+    objects do not survive the worker's app context). Rows present on two
+    shards mid-move are returned once. Scoped requests and unsharded setups
+    call query_fn once on the current shard.
+    """
+    if current_shard() is not None or not current_app.config['SHARDS']:
+        return query_fn()
+
+    app = current_app._get_current_object()
+
+    def run(shard):
+        with app.app_context():
+            g.shard = shard
+            return query_fn()
+
+    shards = shard_names()
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        results = list(pool.map(run, shards))
+
+    merged, seen = [], set()
+    for row in (row for rows in results for row in rows):
+        if row.get('id') is not None:
+            if row['id'] in seen:
+                continue
+            seen.add(row['id'])
+        merged.append(row)
+    merged.sort(key=lambda row: row.get('id', 0))
+    return merged
+
+
+def create_shard_tables():
+    """Create the model tables on every configured shard."""
+    from .models import db
+    tables = [t for t in db.metadata.sorted_tables if t.name not in DIRECTORY_TABLES]
+    for shard in current_app.config['SHARDS']:
+        db.metadata.create_all(bind=engine_for(shard), tables=tables)
+
+
+def _estate_ids(conn, tables, estate_id):
+    def ids(table):
+        return [r.id for r in conn.execute(
+            sa.select(table.c.id).where(table.c.estate_id == estate_id))]
+    return {name: ids(tables[name]) for name in ('user', 'event', 'post', 'project')}
+
+
+def _estate_rows(conn, tables, estate_id):
+    """Select every row that belongs to estate_id, in FK dependency order."""
+    t = tables
+    ids = _estate_ids(conn, tables, estate_id)
+    selects = [
+        ('estate', t['estate'].c.id == estate_id),
+        ('user', t['user'].c.estate_id == estate_id),
+        ('event', t['event'].c.estate_id == estate_id),
+        ('event_recurrence', t['event_recurrence'].c.event_id.in_(ids['event'])),
+        ('post', t['post'].c.estate_id == estate_id),
+        ('project', t['project'].c.estate_id == estate_id),
+        ('comment', t['comment'].c.post_id.in_(ids['post'])),
+        ('event_attendees', t['event_attendees'].c.event_id.in_(ids['event'])),
+        ('project_contributors', t['project_contributors'].c.project_id.in_(ids['project'])),
+    ]
+    return [(name, where, [dict(r._mapping) for r in conn.execute(
+        sa.select(t[name]).where(where))]) for name, where in selects]
+
+
+def cross_estate_references(conn, tables, estate_id):
+    """Foreign keys that would point across shards after moving estate_id.
+
+    Returns {description: count} for every non-zero kind of reference
+    between the estate's rows and rows outside it.
+    """
+    t = tables
+    ids = _estate_ids(conn, tables, estate_id)
+    users, events, posts, projects = ids['user'], ids['event'], ids['post'], ids['project']
+
+    def outside(table):
+        return sa.or_(table.c.estate_id != estate_id, table.c.estate_id.is_(None))
+
+    def inside_users(column):
+        return column.in_(users)
+
+    def outside_users(column):
+        return column.notin_(users)
+
+    checks = {
+        'posts elsewhere by moved users': sa.select(sa.func.count()).select_from(t['post'])
+            .where(outside(t['post']), inside_users(t['post'].c.author_id)),
+        'events elsewhere created by moved users': sa.select(sa.func.count()).select_from(t['event'])
+            .where(outside(t['event']), inside_users(t['event'].c.creator_id)),
+        'projects elsewhere created by moved users': sa.select(sa.func.count()).select_from(t['project'])
+            .where(outside(t['project']), inside_users(t['project'].c.creator_id)),
+        'comments elsewhere by moved users': sa.select(sa.func.count()).select_from(t['comment'])
+            .where(t['comment'].c.post_id.notin_(posts), inside_users(t['comment'].c.author_id)),
+        'comments on moved posts by outside users': sa.select(sa.func.count()).select_from(t['comment'])
+            .where(t['comment'].c.post_id.in_(posts), outside_users(t['comment'].c.author_id)),
+        'moved posts by outside users': sa.select(sa.func.count()).select_from(t['post'])
+            .where(t['post'].c.id.in_(posts), outside_users(t['post'].c.author_id)),
+        'moved events created by outside users': sa.select(sa.func.count()).select_from(t['event'])
+            .where(t['event'].c.id.in_(events), outside_users(t['event'].c.creator_id)),
+        'moved projects created by outside users': sa.select(sa.func.count()).select_from(t['project'])
+            .where(t['project'].c.id.in_(projects), outside_users(t['project'].c.creator_id)),
+        'attendances crossing the estate': sa.select(sa.func.count()).select_from(t['event_attendees'])
+            .where(t['event_attendees'].c.event_id.in_(events)
+                   != t['event_attendees'].c.user_id.in_(users)),
+        'contributions crossing the estate': sa.select(sa.func.count()).select_from(t['project_contributors'])
+            .where(t['project_contributors'].c.project_id.in_(projects)
+                   != t['project_contributors'].c.user_id.in_(users)),
+    }
+    counts = {name: conn.execute(query).scalar() for name, query in checks.items()}
+    return {name: count for name, count in counts.items() if count}
+
+
+def _set_map(estate_id, **values):
+    """Update an estate's shard map entry and bump the map version."""
+    from .models import db, EstateShard
+    version = (db.session.query(sa.func.max(EstateShard.version)).scalar() or 0) + 1
+    entry = db.session.get(EstateShard, estate_id)
+    if entry is None:
+        entry = EstateShard(estate_id=estate_id, shard=current_app.config['DEFAULT_SHARD'])
+        db.session.add(entry)
+    for key, value in values.items():
+        setattr(entry, key, value)
+    entry.version = version
+    db.session.commit()
+    _state()['cache'].clear()
+
+
+def move_estate(estate_id, target, grace=None, force=False):
+    """Move an estate's rows to target.
+
+    1. Mark the estate as moving: every worker sees the new map version on
+       its next request and rejects writes to the estate with 503.
+    2. Wait `grace` seconds (SHARD_MOVE_GRACE) for writes already in flight.
+    3. Copy the rows, repoint the shard map, then delete the source rows.
+
+    Refuses (LookupError) if rows would be left with foreign keys into
+    another shard, unless force is set. Rows keep their global ids.
+    """
+    from .models import db
+
+    if target not in shard_names():
+        raise ValueError(f'Unknown shard {target!r}')
+    _sync_map_version()
+    source, moving = shard_entry(estate_id)
+    if moving:
+        raise RuntimeError(f'Estate {estate_id} is already being moved')
+    if source == target:
+        return 0
+
+    tables = db.metadata.tables
+    with engine_for(source).connect() as src:
+        if src.execute(sa.select(tables['estate'].c.id)
+                       .where(tables['estate'].c.id == estate_id)).first() is None:
+            raise LookupError(f'Estate {estate_id} not found on shard {source!r}')
+        crossing = cross_estate_references(src, tables, estate_id)
+    if crossing and not force:
+        details = ', '.join(f'{count} {name}' for name, count in crossing.items())
+        raise LookupError(f'Estate {estate_id} has cross-estate references: {details}')
+
+    _set_map(estate_id, shard=source, moving=True)
+    try:
+        time.sleep(current_app.config['SHARD_MOVE_GRACE'] if grace is None else grace)
+        with engine_for(source).connect() as src:
+            batches = _estate_rows(src, tables, estate_id)
+        with engine_for(target).begin() as dst:
+            for name, _, rows in batches:
+                if rows:
+                    dst.execute(tables[name].insert(), rows)
+    except Exception:
+        _set_map(estate_id, moving=False)
+        raise
+
+    _set_map(estate_id, shard=target, moving=False)
+    with engine_for(source).begin() as src:
+        for name, where, _ in reversed(batches):
+            src.execute(tables[name].delete().where(where))
+
+    return sum(len(rows) for _, _, rows in batches)
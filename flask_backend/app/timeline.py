@@ -0,0 +1,339 @@
+"""Per-user "my community" timeline: estate posts and comments, attended
+events and contributed projects, newest first.
+
+Timelines live in a bounded in-process store. A user's timeline is built
+from the database on first read and then kept current on write: new posts
+and comments are pushed to the cached timelines of their estate, events and
+projects to their attendees and contributors. Estates with more than
+TIMELINE_FANOUT_LIMIT residents are not pushed to; their posts and comments
+are read from the database and merged at read time instead.
+
+Memory is bounded by TIMELINE_MAX_USERS cached timelines (least recently
+read are evicted) of at most TIMELINE_MAX_ITEMS entries each: the newest
+ones. Pages older than a truncated timeline's oldest entry are read from the
+database, so the cap bounds memory, not history. The store is
+per process, so writes served by another worker are not pushed here; a
+cached timeline is rebuilt once it is older than TIMELINE_TTL seconds.
+
+Entries are ordered by created_at (sub-second, see models.utcnow), then id,
+so items written within the same timestamp keep their insertion order.
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app
+
+from .models import db, User, Post, Comment, Event, Project, event_attendees
+
+
+def entry_key(entry):
+    return (entry['created_at'], entry['id'], entry['type'])
+
+
+def encode_cursor(key):
+    created_at, item_id, kind = key
+    return f'{created_at.isoformat()}~{item_id}~{kind}'
+
+
+def decode_cursor(cursor):
+    """Parse a cursor returned as next_before; raises ValueError."""
+    created_at, item_id, kind = cursor.split('~')
+    return (datetime.fromisoformat(created_at), int(item_id), kind)
+
+
+def post_entry(post):
+    return {'type': 'post', 'id': post.id, 'estate_id': post.estate_id,
+            'created_at': post.created_at, 'title': post.title,
+            'author_id': post.author_id}
+
+
+def comment_entry(comment, estate_id):
+    return {'type': 'comment', 'id': comment.id, 'estate_id': estate_id,
+            'created_at': comment.created_at, 'post_id': comment.post_id,
+            'author_id': comment.author_id, 'content': comment.content}
+
+
+def event_entry(event):
+    return {'type': 'event', 'id': event.id, 'estate_id': event.estate_id,
+            'created_at': event.created_at, 'name': event.name,
+            'date': event.date.isoformat()}
+
+
+def project_entry(project):
+    return {'type': 'project', 'id': project.id, 'estate_id': project.estate_id,
+            'created_at': project.created_at, 'project_name': project.project_name,
+            'state': project.state}
+
+
+def _newest_before(keys, entries, before, limit, truncated):
+    """(page, complete); complete is False if the page runs past the oldest
+    entry of a truncated timeline and so needs the database.
+    """
+    end = len(keys) if before is None else bisect_left(keys, before)
+    return entries[max(end - limit, 0):end][::-1], not truncated or end >= limit
+
+
+class _Timeline:
+    __slots__ = ('estate_id', 'large_estate', 'truncated', 'loaded_at', 'keys', 'entries')
+
+    def __init__(self, estate_id, large_estate, truncated):
+        self.estate_id = estate_id
+        self.large_estate = large_estate  # estate feed merged at read time
+        self.truncated = truncated        # older entries exist only in the database
+        self.loaded_at = time.monotonic()
+        self.keys = []      # ascending sort keys
+        self.entries = []   # entries, parallel to keys
+
+
+class TimelineStore:
+    """Bounded, thread-safe LRU of per-user timelines."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timelines = OrderedDict()  # user_id -> _Timeline, LRU order
+        self._by_estate = {}             # estate_id -> set of cached user ids
+        self._holders = {}               # (type, id) -> set of user ids holding it
+
+    def clear(self):
+        with self._lock:
+            self._timelines.clear()
+            self._by_estate.clear()
+            self._holders.clear()
+
+    def load(self, user_id, estate_id, large_estate, truncated, entries, max_users, max_items):
+        """Cache a freshly built timeline, evicting the least recently used."""
+        timeline = _Timeline(estate_id, large_estate, truncated)
+        with self._lock:
+            self._drop(user_id)
+            self._timelines[user_id] = timeline
+            self._by_estate.setdefault(estate_id, set()).add(user_id)
+            for entry in entries:
+                self._insert(user_id, timeline, entry, max_items)
+            while len(self._timelines) > max_users:
+                self._drop(next(iter(self._timelines)))
+
+    def page(self, user_id, before, limit, ttl):
+        """Newest-first entries older than the before key, O(log n + limit).
+
+        Returns (entries, large_estate, complete) (see _newest_before), or
+        None if the user is not cached or the cached timeline is older than
+        ttl seconds.
+        """
+        with self._lock:
+            timeline = self._timelines.get(user_id)
+            if timeline is None:
+                return None
+            if time.monotonic() - timeline.loaded_at > ttl:
+                self._drop(user_id)
+                return None
+            self._timelines.move_to_end(user_id)
+            entries, complete = _newest_before(timeline.keys, timeline.entries, before,
+                                               limit, timeline.truncated)
+            return entries, timeline.large_estate, complete
+
+    def discard(self, user_id):
+        with self._lock:
+            self._drop(user_id)
+
+    def push(self, user_ids, entry, max_items):
+        """Add entry to whichever of user_ids currently have a cached timeline."""
+        with self._lock:
+            for user_id in user_ids:
+                timeline = self._timelines.get(user_id)
+                if timeline is not None:
+                    self._insert(user_id, timeline, entry, max_items)
+
+    def push_estate(self, estate_id, entry, max_items):
+        with self._lock:
+            for user_id in self._by_estate.get(estate_id, ()):
+                self._insert(user_id, self._timelines[user_id], entry, max_items)
+
+    def retract(self, kind, item_id):
+        """Remove an item from every cached timeline holding it."""
+        with self._lock:
+            for user_id in self._holders.pop((kind, item_id), ()):
+                timeline = self._timelines[user_id]
+                for i, entry in enumerate(timeline.entries):
+                    if entry['type'] == kind and entry['id'] == item_id:
+                        del timeline.keys[i], timeline.entries[i]
+                        break
+
+    def _insert(self, user_id, timeline, entry, max_items):
+        key = entry_key(entry)
+        i = bisect_left(timeline.keys, key)
+        if i < len(timeline.keys) and timeline.keys[i] == key:
+            timeline.entries[i] = entry
+            return
+        insort(timeline.keys, key)
+        timeline.entries.insert(i, entry)
+        self._holders.setdefault((entry['type'], entry['id']), set()).add(user_id)
+        if len(timeline.keys) > max_items:
+            timeline.truncated = True
+            oldest = timeline.entries.pop(0)
+            timeline.keys.pop(0)
+            self._release(oldest, user_id)
+
+    def _drop(self, user_id):
+        timeline = self._timelines.pop(user_id, None)
+        if timeline is None:
+            return
+        self._by_estate.get(timeline.estate_id, set()).discard(user_id)
+        for entry in timeline.entries:
+            self._release(entry, user_id)
+
+    def _release(self, entry, user_id):
+        item = (entry['type'], entry['id'])
+        holders = self._holders.get(item)
+        if holders is not None:
+            holders.discard(user_id)
+            if not holders:
+                del self._holders[item]
+
+
+store = TimelineStore()
+
+
+def _config(name):
+    return current_app.config[name]
+
+
+def is_large_estate(estate_id):
+    if estate_id is None:
+        return False
+    residents = User.query.filter_by(estate_id=estate_id).count()
+    return residents > _config('TIMELINE_FANOUT_LIMIT')
+
+
+def _estate_entries(estate_id, before, limit):
+    """Newest estate posts and comments older than before, from the database."""
+    post_query = Post.query.filter(Post.estate_id == estate_id)
+    comment_query = (db.session.query(Comment, Post.estate_id)
+                     .join(Post, Comment.post_id == Post.id)
+                     .filter(Post.estate_id == estate_id))
+    if before is not None:
+        post_query = post_query.filter(Post.created_at <= before[0])
+        comment_query = comment_query.filter(Comment.created_at <= before[0])
+    posts = post_query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1)
+    comments = comment_query.order_by(Comment.created_at.desc(), Comment.id.desc()).limit(limit + 1)
+    entries = ([post_entry(p) for p in posts]
+               + [comment_entry(c, post_estate_id) for c, post_estate_id in comments])
+    if before is not None:
+        entries = [e for e in entries if entry_key(e) < before]
+    return entries
+
+
+def _database_entries(user, before, limit, with_estate):
+    """Candidates for the newest limit entries older than before, ascending.
+
+    Each source returns up to limit rows, so the result can be longer than
+    limit; anything past the newest limit is not guaranteed complete.
+    """
+    attending = Event.query.join(event_attendees).filter(event_attendees.c.user_id == user.id)
+    projects = user.contributed_projects
+    if before is not None:
+        attending = attending.filter(Event.created_at <= before[0])
+        projects = projects.filter(Project.created_at <= before[0])
+    entries = [event_entry(e) for e in
+               attending.order_by(Event.created_at.desc(), Event.id.desc()).limit(limit)]
+    entries += [project_entry(p) for p in
+                projects.order_by(Project.created_at.desc(), Project.id.desc()).limit(limit)]
+    if user.estate_id is not None and with_estate:
+        entries += _estate_entries(user.estate_id, before, limit)
+    if before is not None:
+        entries = [e for e in entries if entry_key(e) < before]
+    entries.sort(key=entry_key)
+    return entries
+
+
+def _load(user, before, limit):
+    """Build a user's timeline from the database, cache it and return a page
+    of it, as TimelineStore.page does.
+    """
+    max_items = _config('TIMELINE_MAX_ITEMS')
+    large = is_large_estate(user.estate_id)
+    entries = _database_entries(user, None, max_items, not large)
+    truncated = len(entries) >= max_items
+    entries = entries[-max_items:]
+    store.load(user.id, user.estate_id, large, truncated, entries,
+               _config('TIMELINE_MAX_USERS'), max_items)
+    page, complete = _newest_before([entry_key(e) for e in entries], entries, before, limit,
+                                    truncated)
+    return page, large, complete
+
+
+def get_page(user, before=None, limit=20):
+    """One page of a user's timeline, newest first."""
+    cached = store.page(user.id, before, limit, _config('TIMELINE_TTL'))
+    if cached is None:
+        cached = _load(user, before, limit)
+    entries, large, complete = cached
+    if not complete:
+        # Older than anything cached: read the whole page from the database
+        return _database_entries(user, before, limit, True)[::-1][:limit]
+    if large:
+        # Fan-out on read: merge the estate feed in from the database
+        entries = sorted(entries + _estate_entries(user.estate_id, before, limit),
+                         key=entry_key, reverse=True)[:limit]
+    return entries
+
+
+def _non_fatal(fn):
+    """Timeline updates run after the write has committed, so a failure must
+    not fail the request. Log it and drop the cached timelines instead; they
+    are rebuilt from the database on next read.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            current_app.logger.exception('Timeline update %s failed', fn.__name__)
+            store.clear()
+    return wrapper
+
+
+@_non_fatal
+def publish_post(post):
+    store.retract('post', post.id)
+    if post.estate_id is not None and not is_large_estate(post.estate_id):
+        store.push_estate(post.estate_id, post_entry(post), _config('TIMELINE_MAX_ITEMS'))
+
+
+@_non_fatal
+def publish_comment(comment):
+    store.retract('comment', comment.id)
+    if comment.post is None:
+        return
+    estate_id = comment.post.estate_id
+    if estate_id is not None and not is_large_estate(estate_id):
+        store.push_estate(estate_id, comment_entry(comment, estate_id),
+                          _config('TIMELINE_MAX_ITEMS'))
+
+
+@_non_fatal
+def publish_event(event):
+    store.retract('event', event.id)
+    store.push([user.id for user in event.attendees], event_entry(event),
+               _config('TIMELINE_MAX_ITEMS'))
+
+
+@_non_fatal
+def publish_project(project):
+    store.retract('project', project.id)
+    store.push([user.id for user in project.contributors], project_entry(project),
+               _config('TIMELINE_MAX_ITEMS'))
+
+
+@_non_fatal
+def retract(kind, item_id):
+    store.retract(kind, item_id)
+
+
+@_non_fatal
+def forget_user(user_id):
+    """Drop a cached timeline, e.g. after the user changes estate."""
+    store.discard(user_id)
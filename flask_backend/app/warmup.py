@@ -0,0 +1,135 @@
+"""Warm-up and fork handling for production workers (see gunicorn.conf.py).
+
+With preload_app the master imports the app once, configures the mappers and
+runs every GET route of main_bp, which fills each engine's compiled-statement
+cache; forked workers inherit all of that. By-id routes are run with the
+lowest existing id so their real queries execute. Statements are compiled
+(and cached) unchanged; only the SQL handed to the driver is wrapped to
+return one row, so list routes do not load whole tables on every boot.
+Each worker then drops the pool connections it inherited (fork-safe
+disposal) and opens its own before gunicorn lets it accept connections.
+"""
+import time
+
+import sqlalchemy as sa
+from flask import url_for
+from sqlalchemy.orm import configure_mappers
+
+from . import timeline
+from .models import db
+from .sharding import ENTITY_ARGS
+
+# Probes have nothing to prime
+SKIP_ENDPOINTS = {'main.healthz', 'main.readyz'}
+ID_ARGS = dict(ENTITY_ARGS, estate_id='estate')
+
+
+def _state(app):
+    return app.extensions.setdefault('warmup', {})
+
+
+def _first_id(table):
+    """Lowest id of table on any engine, or None if it is empty everywhere."""
+    column = db.metadata.tables[table].c.id
+    ids = []
+    for engine in db.engines.values():
+        with engine.connect() as connection:
+            ids.append(connection.execute(sa.select(sa.func.min(column))).scalar())
+    return min((i for i in ids if i is not None), default=None)
+
+
+def _one_row(conn, cursor, statement, parameters, context, executemany):
+    # Runs after compilation, so the compiled-statement cache keeps the
+    # statement real requests will run; only the driver sees the wrapper.
+    if statement.lstrip()[:6].upper() == 'SELECT':
+        statement = f'SELECT * FROM ({statement}) AS warmup_rows LIMIT 1'
+    return statement, parameters
+
+
+def prime_routes(app):
+    """Run every GET route of main_bp once, with real ids and one-row results.
+
+    Routes whose id argument has no row yet are skipped.
+    """
+    client = app.test_client()
+    urls = []
+    with app.app_context():
+        ids = {arg: _first_id(table) for arg, table in ID_ARGS.items()}
+    with app.test_request_context():
+        for rule in app.url_map.iter_rules():
+            if (not rule.endpoint.startswith('main.') or 'GET' not in rule.methods
+                    or rule.endpoint in SKIP_ENDPOINTS):
+                continue
+            values = {arg: ids.get(arg) for arg in rule.arguments}
+            if None not in values.values():
+                urls.append(url_for(rule.endpoint, **values))
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        sa.event.listen(engine, 'before_cursor_execute', _one_row, retval=True)
+    try:
+        for url in urls:
+            client.get(url, headers={'Accept-Encoding': 'gzip'})
+    finally:
+        for engine in engines:
+            sa.event.remove(engine, 'before_cursor_execute', _one_row)
+        # Timelines built from one-row results must not be served
+        timeline.store.clear()
+    return urls
+
+
+def open_pools(app):
+    """Check out and return pool_size connections on every engine."""
+    with app.app_context():
+        for engine in db.engines.values():
+            size = getattr(engine.pool, 'size', lambda: 1)()
+            size = max(1, min(size, app.config['WARMUP_CONNECTIONS']))
+            connections = [engine.connect() for _ in range(size)]
+            for connection in connections:
+                connection.execute(sa.text('SELECT 1'))
+                connection.close()
+
+
+def dispose_engines(app, close=True):
+    """Drop pooled connections. close=False is the fork-safe variant for a
+    child process: it forgets the parent's connections without closing them.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+
+def warm_up(app):
+    """Configure mappers and prime the statement cache (in the master)."""
+    state = _state(app)
+    started = time.perf_counter()
+    with app.app_context():
+        configure_mappers()
+    state['routes'] = len(prime_routes(app))
+    state['seconds'] = round(time.perf_counter() - started, 3)
+    # Close the master's connections; workers open their own after fork
+    dispose_engines(app)
+    return state
+
+
+def post_fork(app):
+    """Per-worker start-up: fork-safe disposal, then fresh pooled connections.
+
+    Gunicorn runs this before the worker accepts connections, so no request
+    can observe a half-started worker.
+    """
+    dispose_engines(app, close=False)
+    open_pools(app)
+
+
+def check_databases():
+    """Run SELECT 1 on every engine; returns {bind: error or None}."""
+    results = {}
+    for key, engine in db.engines.items():
+        try:
+            with engine.connect() as connection:
+                connection.execute(sa.text('SELECT 1'))
+            results[key or 'default'] = None
+        except Exception as e:
+            results[key or 'default'] = str(e)
+    return results
@@ -0,0 +1,90 @@
+"""First-request latency with and without the production warm-up.
+
+Each mode runs in a fresh interpreter against a seeded temporary SQLite
+database and times the first request to a few routes, as a newly forked
+worker would serve them, plus the second request as the steady-state cost.
+Each figure is the median of RUNS fresh interpreters.
+
+Run: python benchmarks/first_request.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROUTES = ['/api/event', '/api/user/1', '/api/estate/1/events?from=2024-01-01&to=2024-03-01',
+          '/api/user/1/timeline']
+
+CHILD = r'''
+import datetime, json, sys, time
+t0 = time.perf_counter()
+from app import create_app, db
+from app.models import User, Estate, Event, Post, Comment
+app = create_app()
+startup = time.perf_counter() - t0
+if sys.argv[1] == 'seed':
+    with app.app_context():
+        db.session.add(Estate(name='Estate'))
+        db.session.add(User(username='u', email='e', password_hash='x', estate_id=1))
+        db.session.flush()
+        for i in range(200):
+            db.session.add(Event(name=f'e{i}', date=datetime.datetime(2024, 1, 1 + i % 28),
+                                 creator_id=1, estate_id=1))
+        for i in range(100):
+            db.session.add(Post(title=f'p{i}', content='c', author_id=1, estate_id=1))
+        db.session.flush()
+        for i in range(100):
+            db.session.add(Comment(content='c', author_id=1, post_id=i + 1))
+        db.session.commit()
+    sys.exit()
+warmup_ms = None
+if sys.argv[1] == 'warm':
+    from app import warmup
+    t = time.perf_counter()
+    warmup.warm_up(app)
+    warmup.post_fork(app)
+    warmup_ms = (time.perf_counter() - t) * 1000
+client = app.test_client()
+timings = {}
+for url in json.loads(sys.argv[2]):
+    timings[url] = []
+    for _ in range(2):
+        t = time.perf_counter()
+        client.get(url)
+        timings[url].append((time.perf_counter() - t) * 1000)
+print(json.dumps({'startup_ms': startup * 1000, 'warmup_ms': warmup_ms, 'request_ms': timings}))
+'''
+
+
+def run(mode, env):
+    out = subprocess.run([sys.executable, '-c', CHILD, mode, json.dumps(ROUTES)],
+                         env=env, capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(out.stdout) if mode != 'seed' else None
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'))
+        run('seed', env)
+        results = {mode: [run(mode, env) for _ in range(runs)] for mode in ('cold', 'warm')}
+
+    def median(mode, pick):
+        return statistics.median(pick(r) for r in results[mode])
+
+    print(f'medians of {runs} runs')
+    print(f'startup (import + create_app): {median("cold", lambda r: r["startup_ms"]):.1f} ms')
+    print(f'warm-up (in the master): {median("warm", lambda r: r["warmup_ms"]):.1f} ms')
+    print(f'{"route":<55}{"cold 1st":>10}{"warm 1st":>10}{"2nd":>10}')
+    for url in ROUTES:
+        cold = median('cold', lambda r: r['request_ms'][url][0])
+        warm = median('warm', lambda r: r['request_ms'][url][0])
+        steady = median('warm', lambda r: r['request_ms'][url][1])
+        print(f'{url:<55}{cold:>10.2f}{warm:>10.2f}{steady:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
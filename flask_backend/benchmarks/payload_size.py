@@ -0,0 +1,88 @@
+"""Bytes-on-the-wire and CPU cost of the list endpoint encodings.
+
+Builds synthetic event/project rows shaped like api_get_events and
+api_get_projects output, then reports size and encode time for plain rows
+vs. ?format=columnar, uncompressed, gzip and (if installed) brotli.
+
+Run: python benchmarks/payload_size.py [row_count]
+"""
+import json
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def event_rows(n):
+    start = datetime(2024, 1, 1, 18, 0)
+    return [{
+        'id': i,
+        'name': f'Residents meeting {i}',
+        'description': 'Monthly residents association meeting',
+        'date': (start + timedelta(days=7 * i)).isoformat(),
+        'location': 'Community hall',
+        'estate_id': i % 5 + 1,
+        'creator_id': i % 40 + 1,
+        'created_at': (start + timedelta(minutes=i)).isoformat(),
+        'attendees': list(range(1, i % 25 + 2))
+    } for i in range(1, n + 1)]
+
+
+def project_rows(n):
+    start = datetime(2024, 1, 1, 9, 0)
+    return [{
+        'id': i,
+        'project_name': f'Borehole repair phase {i}',
+        'description': 'Repair and maintenance of the shared borehole pump',
+        'estate_id': i % 5 + 1,
+        'creator_id': i % 40 + 1,
+        'state': i % 3 != 0,
+        'cost_estimates': 1500.0 + i,
+        'created_at': (start + timedelta(hours=i)).isoformat(),
+        'contributors': list(range(1, i % 10 + 2))
+    } for i in range(1, n + 1)]
+
+
+def columnar(rows):
+    columns = list(rows[0].keys()) if rows else []
+    return {'columns': columns,
+            'values': [[row[c] for row in rows] for c in columns],
+            'count': len(rows)}
+
+
+def gzip_encode(data):
+    obj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return obj.compress(data) + obj.flush()
+
+
+def timed(fn, data, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(data)
+        best = min(best, time.perf_counter() - t0)
+    return out, best * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    codecs = [('identity', lambda b: b), ('gzip-6', gzip_encode)]
+    if brotli is not None:
+        codecs.append(('br-6', lambda b: brotli.compress(b, quality=6)))
+
+    print(f'{"payload":<18}{"format":<10}{"encoding":<10}{"bytes":>10}{"ms":>9}')
+    for name, rows in (('events', event_rows(n)), ('projects', project_rows(n))):
+        for fmt, payload in (('rows', rows), ('columnar', columnar(rows))):
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            for codec, fn in codecs:
+                out, ms = timed(fn, body)
+                print(f'{name + f"[{n}]":<18}{fmt:<10}{codec:<10}{len(out):>10}{ms:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
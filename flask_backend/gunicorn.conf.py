@@ -0,0 +1,29 @@
+# Production launcher: gunicorn -c gunicorn.conf.py run:app
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Import the app once in the master so workers fork with modules loaded,
+# mappers configured and the compiled-statement cache already filled.
+preload_app = True
+
+
+def when_ready(server):
+    from app import warmup
+    state = warmup.warm_up(server.app.wsgi())
+    server.log.info('Warm-up primed %s routes in %ss', state['routes'], state['seconds'])
+
+
+def post_fork(server, worker):
+    from app import warmup
+    warmup.post_fork(worker.app.wsgi())
+
+
+def worker_exit(server, worker):
+    from app import warmup
+    warmup.dispose_engines(worker.app.wsgi())
@@ -0,0 +1,20 @@
+import pytest
+
+from app import create_app
+from app.config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SHARDS = {}
+
+
+@pytest.fixture
+def app():
+    return create_app(TestConfig)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,78 @@
+import gzip
+import zlib
+
+import pytest
+from flask import Response, jsonify
+
+from app import compression
+
+
+@pytest.fixture
+def client(app):
+    @app.route('/big')
+    def big():
+        return jsonify(['community'] * 200)
+
+    @app.route('/stream')
+    def stream():
+        def chunks():
+            yield '{"a":'
+            yield '1}'
+        return Response(chunks(), mimetype='application/json')
+
+    return app.test_client()
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip', 'gzip'),
+    ('br;q=0.1, gzip', 'gzip'),
+    ('gzip;q=0, identity', None),
+    ('identity, gzip;q=0.5', None),
+    ('', None),
+])
+def test_encoding_ranked_by_q(client, header, expected):
+    response = client.get('/big', headers={'Accept-Encoding': header})
+    assert response.headers.get('Content-Encoding') == expected
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+@pytest.mark.skipif(compression.brotli is None, reason='brotli not installed')
+def test_brotli_preferred_when_ranked_higher(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip;q=0.5, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+
+
+def test_gzip_body_round_trips(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(response.data) == client.get('/big').data
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_stream_chunks_are_flushed(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    first = next(iter(response.response))
+    assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(first) == b'{"a":'
+
+
+def test_columnar_list_round_trips_rows(client):
+    client.post('/api/estate', json={'name': 'A'})
+    client.post('/api/user', json={'username': 'u', 'email': 'e', 'password': 'p',
+                                   'full_name': 'U', 'estate_id': 1})
+    for name in ('meet', 'bbq'):
+        client.post('/api/event', json={'name': name, 'date': '2024-01-01', 'creator_id': 1,
+                                        'estate_id': 1, 'attendees': [1]})
+    rows = client.get('/api/event').json
+    table = client.get('/api/event?format=columnar').json
+    assert table['count'] == 2
+    assert sorted(table['columns']) == sorted(rows[0])
+    assert len(table['values']) == len(table['columns'])
+    assert [dict(zip(table['columns'], values)) for values in zip(*table['values'])] == rows
+
+
+def test_columnar_empty_list(client):
+    assert client.get('/api/project?format=columnar').json == {
+        'columns': [], 'values': [], 'count': 0}
@@ -0,0 +1,144 @@
+from datetime import datetime
+
+import pytest
+
+from app.recurrence import RecurrenceRule, parse_datetime
+
+
+def expand(rule, start, window_start, window_end):
+    return list(RecurrenceRule.parse(rule).occurrences(start, window_start, window_end))
+
+
+def test_parse_datetime_normalizes_to_naive_utc():
+    assert parse_datetime('2024-03-01T10:00:00+03:00') == datetime(2024, 3, 1, 7)
+    assert parse_datetime('2024-03-01T10:00Z') == datetime(2024, 3, 1, 10)
+    assert parse_datetime('2024-03-01') == datetime(2024, 3, 1)
+    with pytest.raises(ValueError):
+        parse_datetime('soon')
+    with pytest.raises(ValueError):
+        parse_datetime(20240301)
+
+
+@pytest.mark.parametrize('rule', [
+    'FREQ=HOURLY', 'FREQ=DAILY;BYDAY=MO', 'FREQ=DAILY;COUNT=0', 'FREQ=DAILY;INTERVAL=x',
+    'FREQ=DAILY;COUNT=2;UNTIL=20240101', 'FREQ', {'a': 1}, ['FREQ=DAILY'], None,
+    'FREQ=DAILY;INTERVAL=999999999', 'FREQ=DAILY;COUNT=999999999', 'FREQ=YEARLY;COUNT=20000',
+    'FREQ=WEEKLY;INTERVAL=100;COUNT=1000',
+])
+def test_invalid_rules_raise_value_error(rule):
+    with pytest.raises(ValueError):
+        RecurrenceRule.parse(rule)
+
+
+def test_month_end_skips_short_months_and_counts_only_real_dates():
+    start = datetime(2024, 1, 31, 18)
+    assert expand('FREQ=MONTHLY;COUNT=4', start, datetime(2024, 1, 1), datetime(2025, 1, 1)) == [
+        datetime(2024, 1, 31, 18), datetime(2024, 3, 31, 18),
+        datetime(2024, 5, 31, 18), datetime(2024, 7, 31, 18)]
+    assert RecurrenceRule.parse('FREQ=MONTHLY;COUNT=4').last_occurrence(start) == datetime(2024, 7, 31, 18)
+
+
+def test_month_end_count_respected_inside_a_later_window():
+    start = datetime(2024, 1, 31)
+    assert expand('FREQ=MONTHLY;COUNT=4', start, datetime(2024, 5, 1), datetime(2025, 1, 1)) == [
+        datetime(2024, 5, 31), datetime(2024, 7, 31)]
+
+
+def test_leap_day_yearly():
+    start = datetime(2024, 2, 29)
+    assert expand('FREQ=YEARLY;COUNT=2', start, datetime(2020, 1, 1), datetime(2040, 1, 1)) == [
+        datetime(2024, 2, 29), datetime(2028, 2, 29)]
+    assert expand('FREQ=YEARLY;UNTIL=20270101', start, datetime(2020, 1, 1), datetime(2040, 1, 1)) == [
+        datetime(2024, 2, 29)]
+
+
+def test_window_jumps_far_ahead():
+    start = datetime(2024, 1, 1, 9)
+    assert expand('FREQ=WEEKLY;INTERVAL=2', start, datetime(2030, 3, 1), datetime(2030, 3, 31)) == [
+        datetime(2030, 3, 4, 9), datetime(2030, 3, 18, 9)]
+    assert expand('FREQ=MONTHLY;INTERVAL=3', datetime(2024, 1, 15),
+                  datetime(2025, 5, 20), datetime(2025, 12, 1)) == [
+        datetime(2025, 7, 15), datetime(2025, 10, 15)]
+
+
+def test_window_is_half_open_and_count_bounds_jumps():
+    start = datetime(2024, 1, 1)
+    assert expand('FREQ=DAILY', start, datetime(2024, 1, 2), datetime(2024, 1, 4)) == [
+        datetime(2024, 1, 2), datetime(2024, 1, 3)]
+    assert expand('FREQ=DAILY;COUNT=3', start, datetime(2024, 1, 5), datetime(2024, 2, 1)) == []
+
+
+def test_series_ends_at_the_last_representable_date():
+    assert expand('FREQ=YEARLY', datetime(9997, 6, 1), datetime(9990, 1, 1), datetime.max) == [
+        datetime(9997, 6, 1), datetime(9998, 6, 1), datetime(9999, 6, 1)]
+    assert expand('FREQ=MONTHLY;COUNT=5', datetime(9999, 10, 31), datetime(9999, 1, 1),
+                  datetime.max) == [datetime(9999, 10, 31), datetime(9999, 12, 31)]
+    assert expand('FREQ=DAILY', datetime(9999, 12, 30), datetime(9999, 12, 31),
+                  datetime.max) == [datetime(9999, 12, 31)]
+    rule = RecurrenceRule.parse('FREQ=WEEKLY;COUNT=10')
+    assert rule.last_occurrence(datetime(9999, 12, 1)) == datetime.max
+    assert RecurrenceRule.parse('FREQ=YEARLY;COUNT=3').last_occurrence(
+        datetime(9999, 1, 31)) == datetime(9999, 1, 31)
+
+
+def test_date_only_until_includes_the_whole_day():
+    rule = RecurrenceRule.parse('FREQ=DAILY;UNTIL=20240103')
+    assert list(rule.occurrences(datetime(2024, 1, 1, 20), datetime(2024, 1, 1),
+                                 datetime(2024, 2, 1)))[-1] == datetime(2024, 1, 3, 20)
+
+
+def test_calendar_rejects_non_string_recurrence(client):
+    client.post('/api/estate', json={'name': 'A'})
+    client.post('/api/user', json={'username': 'u', 'email': 'e', 'password': 'p',
+                                   'full_name': 'U', 'estate_id': 1})
+    response = client.post('/api/event', json={'name': 'x', 'date': '2024-01-01',
+                                               'creator_id': 1, 'recurrence': {'a': 1}})
+    assert response.status_code == 400
+
+
+def test_calendar_expands_within_window(client):
+    client.post('/api/estate', json={'name': 'A'})
+    client.post('/api/user', json={'username': 'u', 'email': 'e', 'password': 'p',
+                                   'full_name': 'U', 'estate_id': 1})
+    client.post('/api/event', json={'name': 'meet', 'date': '2024-01-01T18:00:00', 'creator_id': 1,
+                                    'estate_id': 1, 'recurrence': 'FREQ=WEEKLY'})
+    client.post('/api/event', json={'name': 'bbq', 'date': '2024-02-10', 'creator_id': 1,
+                                    'estate_id': 1})
+    items = client.get('/api/estate/1/events?from=2024-02-01&to=2024-02-15').json
+    assert [(e['name'], e['date']) for e in items] == [
+        ('meet', '2024-02-05T18:00:00'), ('bbq', '2024-02-10T00:00:00'),
+        ('meet', '2024-02-12T18:00:00')]
+
+
+def test_oversized_rules_are_rejected_and_late_series_do_not_break_the_calendar(client):
+    client.post('/api/estate', json={'name': 'A'})
+    client.post('/api/user', json={'username': 'u', 'email': 'e', 'password': 'p',
+                                   'full_name': 'U', 'estate_id': 1})
+    for rule in ('FREQ=DAILY;INTERVAL=999999999', 'FREQ=DAILY;COUNT=999999999',
+                 'FREQ=YEARLY;COUNT=20000'):
+        response = client.post('/api/event', json={'name': 'x', 'date': '2024-01-01',
+                                                   'creator_id': 1, 'estate_id': 1,
+                                                   'recurrence': rule})
+        assert response.status_code == 400
+    response = client.post('/api/event', json={'name': 'late', 'date': '9999-12-01',
+                                               'creator_id': 1, 'estate_id': 1,
+                                               'recurrence': 'FREQ=WEEKLY;COUNT=10'})
+    assert response.status_code == 201
+    assert client.get('/api/estate/1/events?from=2024-01-01&to=2024-02-01').json == []
+    items = client.get('/api/estate/1/events?from=9999-12-01&to=9999-12-31T23:59:59').json
+    assert [e['date'] for e in items] == [f'9999-12-{d:02d}T00:00:00' for d in (1, 8, 15, 22, 29)]
+
+
+def test_calendar_lists_attendees_per_event(client):
+    client.post('/api/estate', json={'name': 'A'})
+    for name in ('a', 'b'):
+        client.post('/api/user', json={'username': name, 'email': name, 'password': 'p',
+                                       'full_name': name, 'estate_id': 1})
+    client.post('/api/event', json={'name': 'meet', 'date': '2024-01-01', 'creator_id': 1,
+                                    'estate_id': 1, 'recurrence': 'FREQ=DAILY',
+                                    'attendees': [2, 1]})
+    client.post('/api/event', json={'name': 'bbq', 'date': '2024-01-02T12:00:00',
+                                    'creator_id': 1, 'estate_id': 1})
+    items = client.get('/api/estate/1/events?from=2024-01-01&to=2024-01-03').json
+    assert [(e['name'], e['attendees']) for e in items] == [
+        ('meet', [1, 2]), ('meet', [1, 2]), ('bbq', [])]
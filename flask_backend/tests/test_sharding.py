@@ -0,0 +1,138 @@
+import pytest
+
+from app import create_app, sharding
+from app.models import db
+from tests.conftest import TestConfig
+
+
+@pytest.fixture
+def config(tmp_path):
+    class ShardedConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path}/default.db'
+        SHARDS = {'east': f'sqlite:///{tmp_path}/east.db'}
+        SHARD_MOVE_GRACE = 0
+    return ShardedConfig
+
+
+@pytest.fixture
+def app(config):
+    return create_app(config)
+
+
+def add_estate(client, name):
+    return client.post('/api/estate', json={'name': name}).json['id']
+
+
+def add_user(client, name, estate_id):
+    return client.post('/api/user', json={'username': name, 'email': f'{name}@x',
+                                          'password': 'p', 'full_name': name,
+                                          'estate_id': estate_id}).json['id']
+
+
+def move(app, estate_id, target, **kwargs):
+    with app.app_context():
+        return sharding.move_estate(estate_id, target, **kwargs)
+
+
+@pytest.fixture
+def moved(app, client):
+    """Estate 1 stays on default, estate 2 (one user, post, comment) moves east."""
+    west, east = add_estate(client, 'West'), add_estate(client, 'East')
+    add_user(client, 'w', west)
+    user = add_user(client, 'e', east)
+    post = client.post('/api/post', json={'title': 't', 'content': 'c', 'author_id': user,
+                                          'estate_id': east}).json['id']
+    client.post('/api/comment', json={'content': 'hi', 'author_id': user, 'post_id': post})
+    assert move(app, east, 'east') == 4
+    return {'estate': east, 'user': user, 'post': post}
+
+
+def test_by_id_routes_follow_the_moved_rows(client, moved):
+    assert client.get(f"/api/user/{moved['user']}").status_code == 200
+    assert client.get(f"/api/post/{moved['post']}").status_code == 200
+    assert client.get(f"/api/estate/{moved['estate']}").status_code == 200
+    assert client.get(f"/api/user/{moved['user']}/timeline").json['items']
+    assert client.patch(f"/api/post/{moved['post']}", json={'title': 'x'}).status_code == 200
+    assert client.get('/api/user/999').status_code == 404
+
+
+def test_rows_left_the_source_shard(app, moved):
+    with app.app_context():
+        with sharding.engine_for('default').connect() as conn:
+            users = conn.execute(db.metadata.tables['user'].select()).all()
+    assert [u.username for u in users] == ['w']
+
+
+def test_ids_are_unique_across_shards(client, moved):
+    add_user(client, 'w2', 1)
+    add_user(client, 'e2', moved['estate'])
+    ids = [u['id'] for u in client.get('/api/user').json]
+    assert len(ids) == len(set(ids)) == 4
+
+
+def test_comment_follows_its_post(app, client, moved):
+    response = client.post('/api/comment', json={'content': 'again', 'author_id': moved['user'],
+                                                 'post_id': moved['post']})
+    assert response.status_code == 201
+    with app.app_context():
+        with sharding.engine_for('east').connect() as conn:
+            assert len(conn.execute(db.metadata.tables['comment'].select()).all()) == 2
+
+
+def test_comment_on_unknown_post_is_rejected(client, moved):
+    response = client.post('/api/comment', json={'content': 'x', 'author_id': 1, 'post_id': 999})
+    assert response.status_code == 400
+
+
+def test_cross_shard_estate_change_is_rejected(client, moved):
+    response = client.patch(f"/api/user/{moved['user']}", json={'estate_id': 1})
+    assert response.status_code == 400
+
+
+def test_writes_blocked_while_moving(app, client):
+    estate = add_estate(client, 'A')
+    user = add_user(client, 'a', estate)
+    with app.app_context():
+        sharding._set_map(estate, moving=True)
+    response = client.post('/api/post', json={'title': 't', 'content': 'c', 'author_id': user,
+                                              'estate_id': estate})
+    assert response.status_code == 503
+    assert client.get(f'/api/estate/{estate}').status_code == 200
+
+
+def test_other_workers_see_the_move(app, client, config):
+    # A second app on the same databases stands in for another worker
+    other = create_app(config).test_client()
+    estate = add_estate(client, 'A')
+    add_user(client, 'a', estate)
+    assert other.get(f'/api/estate/{estate}').status_code == 200  # caches 'default'
+    move(app, estate, 'east')
+    assert other.get(f'/api/estate/{estate}').status_code == 200
+    assert other.get('/api/user?estate_id=%d' % estate).json[0]['username'] == 'a'
+
+
+def test_move_refused_with_cross_estate_references(app, client):
+    west, east = add_estate(client, 'West'), add_estate(client, 'East')
+    user = add_user(client, 'e', east)
+    client.post('/api/post', json={'title': 't', 'content': 'c', 'author_id': user,
+                                   'estate_id': west})
+    with pytest.raises(LookupError, match='posts elsewhere by moved users'):
+        move(app, east, 'east')
+    assert move(app, east, 'east', force=True) == 2
+
+
+def test_new_estates_land_on_a_non_default_default_shard(config):
+    class EastFirst(config):
+        DEFAULT_SHARD = 'east'
+    app = create_app(EastFirst)
+    client = app.test_client()
+    estate = add_estate(client, 'New')
+    user = add_user(client, 'n', estate)
+    assert client.get(f'/api/estate/{estate}').status_code == 200
+    assert client.get(f'/api/user/{user}').json['estate_id'] == estate
+    client.post('/api/event', json={'name': 'meet', 'date': '2024-01-01', 'creator_id': user,
+                                    'estate_id': estate})
+    assert client.get(f'/api/estate/{estate}/events?from=2024-01-01&to=2024-01-02').json
+    with app.app_context():
+        with sharding.engine_for('default').connect() as conn:
+            assert conn.execute(db.metadata.tables['estate'].select()).all() == []
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import timeline
+from app.models import db, Post
+from app.timeline import TimelineStore, entry_key
+
+
+@pytest.fixture(autouse=True)
+def empty_store():
+    timeline.store.clear()
+    yield
+    timeline.store.clear()
+
+
+def entry(item_id, minute, kind='post'):
+    return {'type': kind, 'id': item_id, 'estate_id': 1,
+            'created_at': datetime(2024, 1, 1, 12, minute)}
+
+
+def ids(page):
+    return [e['id'] for e in page[0]]
+
+
+def test_store_evicts_least_recently_read():
+    store = TimelineStore()
+    for user_id in (1, 2):
+        store.load(user_id, 1, False, False, [entry(user_id, 0)], max_users=2, max_items=10)
+    store.page(1, None, 10, ttl=60)
+    store.load(3, 1, False, False, [entry(3, 0)], max_users=2, max_items=10)
+    assert store.page(2, None, 10, ttl=60) is None
+    assert ids(store.page(1, None, 10, ttl=60)) == [1]
+    assert ids(store.page(3, None, 10, ttl=60)) == [3]
+
+
+def test_store_caps_items_and_releases_dropped_entries():
+    store = TimelineStore()
+    store.load(1, 1, False, False, [entry(i, i) for i in range(3)], max_users=10, max_items=3)
+    store.push_estate(1, entry(9, 30), max_items=3)
+    assert ids(store.page(1, None, 10, ttl=60)) == [9, 2, 1]
+    assert ('post', 0) not in store._holders
+    store.retract('post', 2)
+    assert ids(store.page(1, None, 10, ttl=60)) == [9, 1]
+    # The cap dropped entry 0, so a page reaching past entry 1 needs the database
+    assert store.page(1, None, 2, ttl=60)[2] is True
+    assert store.page(1, None, 3, ttl=60)[2] is False
+
+
+def test_store_expires_timelines_after_ttl(monkeypatch):
+    store = TimelineStore()
+    store.load(1, 1, False, False, [entry(1, 0)], max_users=10, max_items=10)
+    now = timeline.time.monotonic()
+    monkeypatch.setattr(timeline.time, 'monotonic', lambda: now + 61)
+    assert store.page(1, None, 10, ttl=60) is None
+    assert 1 not in store._by_estate[1]
+
+
+def test_same_timestamp_orders_by_id_not_type():
+    a, b = entry(1, 0, 'project'), entry(2, 0, 'comment')
+    assert sorted([b, a], key=entry_key) == [a, b]
+
+
+def setup_estate(client):
+    client.post('/api/estate', json={'name': 'A'})
+    client.post('/api/user', json={'username': 'u', 'email': 'e', 'password': 'p',
+                                   'full_name': 'U', 'estate_id': 1})
+
+
+def add_post(client, title):
+    return client.post('/api/post', json={'title': title, 'content': 'c',
+                                          'author_id': 1, 'estate_id': 1})
+
+
+def test_cursor_pages_through_cached_and_pushed_items(client):
+    setup_estate(client)
+    for i in range(3):
+        add_post(client, f'p{i}')
+    client.get('/api/user/1/timeline')  # cache, then push the rest
+    for i in range(3, 7):
+        add_post(client, f'p{i}')
+    client.post('/api/comment', json={'content': 'c', 'author_id': 1, 'post_id': 7})
+
+    seen, before = [], None
+    while True:
+        page = client.get('/api/user/1/timeline', query_string={
+            'limit': 3, **({'before': before} if before else {})}).json
+        seen += [(e['type'], e.get('title')) for e in page['items']]
+        before = page['next_before']
+        if before is None:
+            break
+    assert seen == [('comment', None)] + [('post', f'p{i}') for i in range(6, -1, -1)]
+
+
+def test_bad_cursor_is_rejected(client):
+    setup_estate(client)
+    assert client.get('/api/user/1/timeline?before=nope').status_code == 400
+
+
+def test_large_estate_reads_estate_feed_from_database(app, client):
+    app.config['TIMELINE_FANOUT_LIMIT'] = 0
+    setup_estate(client)
+    add_post(client, 'old')
+    client.get('/api/user/1/timeline')
+    add_post(client, 'new')
+    client.post('/api/comment', json={'content': 'c', 'author_id': 1, 'post_id': 2})
+    items = client.get('/api/user/1/timeline').json['items']
+    assert [(e['type'], e['id'], e['estate_id']) for e in items] == [
+        ('comment', 1, 1), ('post', 2, 1), ('post', 1, 1)]
+
+
+def test_publish_failure_does_not_fail_committed_write(app, client, monkeypatch):
+    setup_estate(client)
+    client.get('/api/user/1/timeline')
+
+    def broken(estate_id):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(timeline, 'is_large_estate', broken)
+    response = add_post(client, 'p')
+    assert response.status_code == 201
+    with app.app_context():
+        assert db.session.get(Post, response.json['id']) is not None
+    assert timeline.store.page(1, None, 10, ttl=60) is None  # rebuilt on next read
+
+
+def test_comment_on_missing_post_is_not_published(client):
+    setup_estate(client)
+    client.get('/api/user/1/timeline')
+    response = client.post('/api/comment', json={'content': 'c', 'author_id': 1, 'post_id': 99})
+    assert response.status_code == 201
+    assert client.get('/api/user/1/timeline').json['items'] == []
+
+
+def test_stale_timeline_is_rebuilt_after_ttl(app, client):
+    setup_estate(client)
+    client.get('/api/user/1/timeline')
+    with app.app_context():
+        # A write served by another worker: nothing is pushed to this store
+        db.session.add(Post(title='elsewhere', content='c', author_id=1, estate_id=1,
+                            created_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+    assert client.get('/api/user/1/timeline').json['items'] == []
+    app.config['TIMELINE_TTL'] = -1
+    assert [e['title'] for e in client.get('/api/user/1/timeline').json['items']] == ['elsewhere']
+
+
+def test_paging_continues_past_the_cache_cap(app, client):
+    app.config['TIMELINE_MAX_ITEMS'] = 10
+    setup_estate(client)
+    for i in range(20):
+        add_post(client, f'p{i}')
+    client.get('/api/user/1/timeline')  # caches the newest 10
+    for i in range(20, 25):
+        add_post(client, f'p{i}')       # pushed, evicting older ones
+
+    titles, before = [], None
+    while True:
+        page = client.get('/api/user/1/timeline', query_string={
+            'limit': 5, **({'before': before} if before else {})}).json
+        titles += [e['title'] for e in page['items']]
+        before = page['next_before']
+        if before is None:
+            break
+    assert titles == [f'p{i}' for i in range(24, -1, -1)]
@@ -0,0 +1,57 @@
+from app import create_app, warmup
+from app.models import db
+from tests.conftest import TestConfig
+
+
+def seed(client):
+    client.post('/api/estate', json={'name': 'A'})
+    client.post('/api/user', json={'username': 'u', 'email': 'e', 'password': 'p',
+                                   'full_name': 'U', 'estate_id': 1})
+    for i in range(3):
+        client.post('/api/event', json={'name': f'e{i}', 'date': '2024-01-01',
+                                        'creator_id': 1, 'estate_id': 1, 'attendees': [1]})
+
+
+def test_prime_routes_uses_real_ids_and_skips_empty_tables(app, client):
+    seed(client)
+    urls = warmup.prime_routes(app)
+    assert '/api/user/1' in urls and '/api/event/1' in urls
+    assert '/api/estate/1/events' in urls and '/api/user/1/timeline' in urls
+    assert not any(url.startswith(('/api/post/', '/api/comment/', '/api/project/'))
+                   for url in urls)
+
+
+def test_first_request_after_warm_up_compiles_nothing(tmp_path):
+    class FileConfig(TestConfig):
+        # Warm-up disposes the pools, which would drop an in-memory database
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path}/warm.db'
+    app = create_app(FileConfig)
+    client = app.test_client()
+    seed(client)
+    client.post('/api/post', json={'title': 't', 'content': 'c', 'author_id': 1, 'estate_id': 1})
+    client.post('/api/comment', json={'content': 'c', 'author_id': 1, 'post_id': 1})
+    client.post('/api/project', json={'project_name': 'p', 'creator_id': 1, 'estate_id': 1,
+                                      'contributors': [1]})
+    with app.app_context():
+        cache = db.engine._compiled_cache
+    cache.clear()
+    warmup.warm_up(app)
+    warmup.post_fork(app)
+
+    new = {}
+    for url in ['/api/event', '/api/event/1', '/api/user', '/api/user/1', '/api/user/1/timeline',
+                '/api/estate', '/api/estate/1', '/api/estate/1/events?from=2024-01-01&to=2024-02-01',
+                '/api/post', '/api/post/1', '/api/comment', '/api/comment/1',
+                '/api/project', '/api/project/1']:
+        before = len(cache)
+        assert client.get(url).status_code == 200
+        new[url] = len(cache) - before
+    assert new == dict.fromkeys(new, 0)
+    # Full results once the warm-up is over
+    assert len(client.get('/api/event').json) == 3
+
+
+def test_readyz_reports_databases(client):
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.json == {'status': 'ready', 'databases': ['default']}